@@ -0,0 +1,235 @@
+__license__ = "GPLv3"
+__doc__ = """
+ColumnStore.py:
+Loads several converted worksheets (.tsv, or the 2016 .csv files) into one
+column store.  Categorical fields are dictionary encoded into small integer
+arrays whose dictionaries are shared by all worksheets, numeric fields go
+into typed arrays, and each distinct explanation is stored once.  Filtering
+and grouping work on the integer codes.
+"""
+
+import array
+import collections
+import math
+import re
+
+import TSVBlocks
+
+
+# HBWSPage.get_spreadsheet_header(), plus the worksheet a row was loaded from
+FIELDS = ["worksheet", "datetime", "pagenum", "pages", "year0", "year1", "detail_type",
+          "department_code", "department", "program_id", "program_name", "structure_number",
+          "subject_committee_code", "subject_committee_name", "sequence_num", "explanation",
+          "pos_perm_y0", "pos_temp_y0", "amt_y0", "mof_y0",
+          "pos_perm_y1", "pos_temp_y1", "amt_y1", "mof_y1"]
+
+CATEGORICAL_FIELDS = ["worksheet", "datetime", "detail_type", "department_code", "department",
+                      "program_name", "structure_number", "subject_committee_code",
+                      "subject_committee_name", "sequence_num", "mof_y0", "mof_y1"]
+
+INT_FIELDS = ["pagenum", "pages", "year0", "year1", "program_id"]
+POS_FIELDS = ["pos_perm_y0", "pos_temp_y0", "pos_perm_y1", "pos_temp_y1"]
+AMT_FIELDS = ["amt_y0", "amt_y1"]
+
+# the 2016 worksheets only have one position count per year
+LEGACY_FIELDS = {"pos_y0": "pos_perm_y0", "pos_y1": "pos_perm_y1"}
+
+# code array typecodes, and the largest code each can hold
+CODE_TYPECODES = [("B", 0xff), ("H", 0xffff), ("I", 0xffffffff)]
+
+# empty cells of integer columns, empty position counts are NaN
+MISSING_INT = -1
+MISSING_AMT = -(1 << 63)
+
+
+NUMBER_RE = re.compile(r"(\()?([0-9,]*\.?[0-9]+)(\))?")
+
+
+def parse_number(txt):
+    """Worksheet number: commas are thousands separators, parentheses mean negative
+
+    Returns None for cells that aren't a number, the published worksheets
+    have a few cells where explanation text bled into a number column.
+    """
+    match = NUMBER_RE.fullmatch(txt)
+    if not match or bool(match.group(1)) != bool(match.group(3)):
+        return None
+    num = match.group(2).replace(",", "")
+    num = float(num) if "." in num else int(num)
+    return -num if match.group(1) else num
+
+
+class Dictionary(object):
+    """Shared string <-> integer code mapping"""
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """Code of value, or None if no row has it"""
+        return self.codes.get(value)
+
+
+class ColumnStore(object):
+    """Rows of any number of worksheets, stored by column"""
+    def __init__(self):
+        self.nrows = 0
+        # (worksheet, rownum, field, text) of numeric cells that didn't parse, stored as empty
+        self.bad_cells = []
+        self.dictionaries = { field: Dictionary() for field in CATEGORICAL_FIELDS + ["explanation"] }
+        # codes start as bytes and are widened when a dictionary outgrows them
+        self.columns = { field: array.array(CODE_TYPECODES[0][0]) for field in CATEGORICAL_FIELDS + ["explanation"] }
+        self.columns.update({ field: array.array("i") for field in INT_FIELDS })
+        self.columns.update({ field: array.array("d") for field in POS_FIELDS })
+        self.columns.update({ field: array.array("q") for field in AMT_FIELDS })
+
+
+    def __len__(self):
+        return self.nrows
+
+
+    @staticmethod
+    def load(filenames):
+        store = ColumnStore()
+        for filename in filenames:
+            store.add_worksheet(filename)
+        return store
+
+
+    def _append_code(self, field, value):
+        code = self.dictionaries[field].encode(value)
+        column = self.columns[field]
+        for typecode, maxcode in CODE_TYPECODES:
+            if code <= maxcode:
+                break
+        if column.itemsize < array.array(typecode).itemsize:
+            column = self.columns[field] = array.array(typecode, column)
+        column.append(code)
+
+
+    def add_worksheet(self, filename, worksheet = None):
+        """Append the rows of one converted worksheet, worksheet defaults to filename"""
+        with open(filename, "rt") as f:
+            rows = TSVBlocks.split_rows(f.read())
+
+        header = [LEGACY_FIELDS.get(field, field) for field in rows[0]]
+        assert "explanation" in header, "{} is not a converted worksheet".format(filename)
+        missing = [""] * len(FIELDS)
+
+        for rownum, row in enumerate(rows[1:]):
+            assert len(row) == len(header), "{} row {} has {} cells, expected {}".format(filename, rownum + 1, len(row), len(header))
+            cells = dict(zip(FIELDS, missing))
+            cells.update(zip(header, row))
+            cells["worksheet"] = worksheet or filename
+            self._append(cells, rownum + 1)
+
+        return self
+
+
+    def _number(self, cells, field, rownum, integer = False):
+        txt = cells[field]
+        if not txt:
+            return None
+        num = parse_number(txt)
+        # integer columns can't hold fractions, don't truncate them
+        if integer and isinstance(num, float) and not num.is_integer():
+            num = None
+        if num is None:
+            self.bad_cells.append((cells["worksheet"], rownum, field, txt))
+        return num
+
+
+    def _append(self, cells, rownum):
+        for field in CATEGORICAL_FIELDS:
+            self._append_code(field, cells[field])
+
+        # the rows of a sequence block share one explanation entry
+        self._append_code("explanation", cells["explanation"])
+
+        for field in INT_FIELDS:
+            num = self._number(cells, field, rownum, integer=True)
+            self.columns[field].append(MISSING_INT if num is None else int(num))
+        for field in POS_FIELDS:
+            num = self._number(cells, field, rownum)
+            self.columns[field].append(math.nan if num is None else float(num))
+        for field in AMT_FIELDS:
+            num = self._number(cells, field, rownum, integer=True)
+            self.columns[field].append(MISSING_AMT if num is None else int(num))
+
+        self.nrows += 1
+
+
+    def value(self, field, rownum):
+        """Decoded value of one cell, None for empty numeric cells"""
+        val = self.columns[field][rownum]
+        if field in self.dictionaries:
+            return self.dictionaries[field].values[val]
+        if field in INT_FIELDS and val == MISSING_INT:
+            return None
+        if field in AMT_FIELDS and val == MISSING_AMT:
+            return None
+        if field in POS_FIELDS and math.isnan(val):
+            return None
+        return val
+
+
+    def row(self, rownum):
+        return { field: self.value(field, rownum) for field in FIELDS }
+
+
+    def where(self, rows = None, **conditions):
+        """Row numbers whose fields equal the given values, optionally only among rows
+
+        Categorical values are looked up once and compared as codes, None
+        selects empty numeric cells.
+        """
+        if rows is None:
+            rows = range(self.nrows)
+
+        for field, val in conditions.items():
+            column = self.columns[field]
+            if field in self.dictionaries:
+                val = self.dictionaries[field].code(val)
+                if val is None:
+                    return []
+            elif val is None and field in POS_FIELDS:
+                # NaN never equals itself
+                rows = [i for i in rows if math.isnan(column[i])]
+                continue
+            elif val is None:
+                val = MISSING_AMT if field in AMT_FIELDS else MISSING_INT
+            rows = [i for i in rows if column[i] == val]
+
+        return list(rows)
+
+
+    def group_sum(self, by, field, rows = None):
+        """{ value of by: sum of field } skipping empty cells, grouping on codes"""
+        if rows is None:
+            rows = range(self.nrows)
+
+        keys = self.columns[by]
+        vals = self.columns[field]
+        missing = MISSING_AMT if field in AMT_FIELDS else MISSING_INT if field in INT_FIELDS else None
+
+        sums = collections.defaultdict(int)
+        for i in rows:
+            val = vals[i]
+            if val == missing or val != val:
+                continue
+            sums[keys[i]] += val
+
+        if by in self.dictionaries:
+            values = self.dictionaries[by].values
+            return { values[code]: total for code, total in sums.items() }
+        return dict(sums)
@@ -85,6 +85,9 @@ MOF = {
 
 
 
+import asyncio
+import codecs
+import os
 import subprocess
 import sys
 import getopt
@@ -92,6 +95,8 @@ import datetime
 import re
 import collections
 import Spans
+import PageFixups
+import TSVBlocks
 
 
 def err(txt):
@@ -105,13 +110,72 @@ def err_col(line, linenum = None):
     err(prefix+line)
 
 
+# Number of PDFs converted at the same time by convert_pdfs()
+DEFAULT_JOBS = 4
+
+# Bytes read from the pdftotext pipe at a time
+PDFTOTEXT_READ_SIZE = 1 << 16
+
+# Output formats: plain TSV, or block-compressed TSV with a per-page index (see TSVBlocks.py)
+FORMATS = ["tsv", "tsvz"]
+
+
+def usage():
+    err("usage: {} [-j jobs] [-f {}] worksheet.pdf [worksheet.pdf ...]".format(sys.argv[0], "|".join(FORMATS)))
+
+
 def main():
-    csv_text = pdf_to_csv(sys.argv[1])
+    try:
+        opts, pdf_filenames = getopt.getopt(sys.argv[1:], "j:f:")
+    except getopt.GetoptError as e:
+        err(e)
+        usage()
+        return 2
+
+    jobs = DEFAULT_JOBS
+    fmt = FORMATS[0]
+    for opt, val in opts:
+        if opt == "-j":
+            jobs = int(val) if val.isdigit() else 0
+        elif opt == "-f":
+            fmt = val
+
+    if not pdf_filenames or fmt not in FORMATS or jobs < 1:
+        usage()
+        return 2
+
+    failed = asyncio.run(convert_pdfs(pdf_filenames, jobs, fmt))
 
-    with open(sys.argv[1][:-4] + ".tsv", "wt") as f:
-        f.write(csv_text)
+    return 1 if failed else 0
 
-    return 0
+
+async def convert_pdfs(pdf_filenames, jobs = DEFAULT_JOBS, fmt = FORMATS[0]):
+    """Convert each PDF to a .tsv (or .tsvz) next to it, at most jobs at a time
+
+    A PDF that fails to convert is reported and doesn't stop the others,
+    returns the filenames of the failed PDFs.
+    """
+    assert jobs >= 1, "jobs must be a positive integer, not {}".format(jobs)
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def convert(pdf_filename):
+        out_filename = pdf_filename[:-4] + "." + fmt
+        try:
+            async with semaphore:
+                if fmt == "tsvz":
+                    await pdf_to_tsvz_async(pdf_filename, out_filename)
+                    return True
+                csv_text = await pdf_to_csv_async(pdf_filename)
+
+            with open(out_filename, "wt") as f:
+                f.write(csv_text)
+        except Exception as e:
+            err("{}: conversion failed: {!r}".format(pdf_filename, e))
+            return False
+        return True
+
+    converted = await asyncio.gather(*[convert(pdf_filename) for pdf_filename in pdf_filenames])
+    return [pdf_filename for pdf_filename, ok in zip(pdf_filenames, converted) if not ok]
 
 
 def row_cells_to_csv(row, delimiter = "\t"):
@@ -121,66 +185,104 @@ def row_cells_to_csv(row, delimiter = "\t"):
     return rowtxt
 
 
-def get_pdf_textpages(pdf_filename):
-    text = pdftotext(pdf_filename)
-
-    # split pages at pagebreak char
-    textpages = text.split("\x0c")
-
-    # remove last page, which texttopdf creates as an empty page
-    textpages = textpages[:-1]
-
-    return textpages
+def pdf_to_csv(pdf_filename):
+    return asyncio.run(pdf_to_csv_async(pdf_filename))
 
 
-def pdf_to_csv(pdf_filename):
+async def pdf_to_csv_async(pdf_filename):
     document_csv_rows = []
 
     # CSV header
     document_csv_rows += [row_cells_to_csv(HBWSPage.get_spreadsheet_header())]
 
-    textpages = get_pdf_textpages(pdf_filename)
+    async for page, page_csv_rows in pdf_pages_async(pdf_filename):
+        document_csv_rows += page_csv_rows
 
-    datetimestr = pdf_creation_datetime(pdf_filename)
+    return "\n".join(document_csv_rows)
 
-    badpages = []
 
-    for pagenum, pagetext in enumerate(textpages):
-        # 1-based indexing for pagenum
-        pagenum += 1
+async def pdf_to_tsvz_async(pdf_filename, tsvz_filename):
+    # write next to the output and only replace it once conversion succeeded
+    tmp_filename = tsvz_filename + ".tmp"
+    try:
+        datetimestr = await pdf_creation_datetime_async(pdf_filename)
 
-        try:
-            page = HBWSPage(pagetext, datetimestr)
-            rows = page.get_spreadsheet_rows()
-            page_csv_rows = [row_cells_to_csv(row) for row in rows]
-            document_csv_rows += page_csv_rows
-        except:
-            badpages.append(pagenum)
-            err("badpage = {}".format(pagenum))
-            raise
+        with open(tmp_filename, "wb") as f:
+            writer = TSVBlocks.TSVBlockWriter(f, HBWSPage.get_spreadsheet_header(),
+                                              pdf_creation_datetime=datetimestr)
 
-    if badpages:
-        err("badpages (#{}) = {}".format(len(badpages), badpages))
+            # one compressed block per page
+            async for page, page_csv_rows in pdf_pages_async(pdf_filename, datetimestr):
+                writer.write_block(page_csv_rows,
+                                   fixups=PAGE_FIXUPS.page_digest(datetimestr, page.pagenum),
+                                   pagenum=page.pagenum,
+                                   department_code=getattr(page, "department_code", None),
+                                   program_id=getattr(page, "program_id", None))
+
+            writer.close()
+        os.replace(tmp_filename, tsvz_filename)
+    except:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
 
-    return "\n".join(document_csv_rows)
 
+async def pdf_pages_async(pdf_filename, datetimestr = None):
+    """Yield (HBWSPage, TSV rows of the page) for each page as pdftotext produces it
 
-def delchar_at_pos(txt, atpos):
-    return txt[:atpos] + txt[atpos+1:]
+    datetimestr is the pdfinfo CreationDate, looked up if not given.
+    """
+    # each document accumulates its own column spans, so interleaved
+    # conversions don't see each other's pages
+    sequences_spans = new_sequences_spans()
+
+    badpages = []
+    pagenum = 0
+    proc = None
+
+    try:
+        # start text extraction and metadata extraction at the same time
+        proc = await start_pdftotext(pdf_filename)
+        if datetimestr is None:
+            datetimestr = await pdf_creation_datetime_async(pdf_filename)
+
+        async for pagetext in pdftotext_pages(proc, pdf_filename):
+            # 1-based indexing for pagenum
+            pagenum += 1
+
+            try:
+                page = HBWSPage(pagetext, datetimestr, sequences_spans)
+                rows = page.get_spreadsheet_rows()
+                page_csv_rows = [row_cells_to_csv(row) for row in rows]
+            except:
+                badpages.append(pagenum)
+                err("badpage = {}".format(pagenum))
+                raise
+
+            yield page, page_csv_rows
+    finally:
+        # don't leave pdftotext behind if metadata or page parsing failed
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+    if badpages:
+        err("badpages (#{}) = {}".format(len(badpages), badpages))
 
-def inschar_at_pos(txt, char, atpos):
-    return txt[:atpos] + char + txt[atpos:]
 
+def new_sequences_spans():
+    return {"program": Spans.Spans(), "department": Spans.Spans()}
 
-PROGRAM_SEQUENCES_SPANS = Spans.Spans()
-DEPARTMENT_SEQUENCES_SPANS = Spans.Spans()
+# Column spans accumulated over the pages of a document, by page type
+SEQUENCES_SPANS = new_sequences_spans()
+
+# Per-document, per-page patches for known pdftotext/worksheet bugs, see page_fixups.json
+PAGE_FIXUPS = PageFixups.PageFixups.load()
 
 
 class HBWSPage:
     """Hawaii Budget Worksheet Page"""
-    def __init__(self, text, datetimestr):
-        global PROGRAM_SEQUENCES_SPANS, DEPARTMENT_SEQUENCES_SPANS
-
+    def __init__(self, text, datetimestr, sequences_spans = SEQUENCES_SPANS):
         self.pdf_creation_datetimestr = datetimestr
 
         # These lines of exactly 84 asterisks mess up parsing
@@ -197,14 +299,9 @@ class HBWSPage:
 
         line = self.getline()
 
-        hd1_2017 = datetimestr == "Wed Mar 15 14:45:43 2017"
-        if hd1_2017:
-            line = ["", "Wednesday, March 15, 2017", "14:45:43 AM"] + line[1:]
-
-        sd1_2017 = datetimestr == "Tue Apr  4 04:26:42 2017"
-        if sd1_2017:
-            line = ["", "Tuesday, April 4, 2017", "04:26:42 AM"] + line[1:]
-
+        # header fixups apply to every page of a document, the page number isn't parsed yet
+        for fixup in PAGE_FIXUPS.rules(datetimestr, None, "header"):
+            line = fixup(line)
 
         self.parse_page_header_line0(line)
         self.parse_page_header_line1(self.getline())
@@ -213,9 +310,10 @@ class HBWSPage:
         self.parse_department_or_program_id(self.getline())
         self.eat_empty_lines()
 
-        self.fix_2017_exec_sheet_bugs()
-        self.fix_2017_hd_sheet_bugs()
-        self.fix_2017_sd_sheet_bugs()
+        page_type = "program" if self.program_page else "department"
+
+        for fixup in PAGE_FIXUPS.rules(datetimestr, self.pagenum, "text", page_type):
+            self.text = fixup(self.text)
 
         if self.program_page:
             # Parse Program Page
@@ -237,15 +335,12 @@ class HBWSPage:
 
         self.sequences = self.find_sequence_blocks()
 
-        # various program pages have MOF for Y2 in col 162 (instead of 163)
-        # this makes the next parse_sequences_span step fail
-        # this hack fixes that by inserting a space in col 162 if needed
-        if self.program_page:
-            self.hack_sequence_blocks(self.sequences, 162)
+        for fixup in PAGE_FIXUPS.rules(datetimestr, self.pagenum, "sequences", page_type):
+            self.sequences = fixup(self.sequences)
 
         spans = self.parse_sequences_spans(self.sequences)
 
-        global_spans = PROGRAM_SEQUENCES_SPANS if self.program_page else DEPARTMENT_SEQUENCES_SPANS
+        global_spans = sequences_spans[page_type]
 
 
 
@@ -284,66 +379,11 @@ class HBWSPage:
                 input()
                 assert 0
 
-        if self.program_page:
-            PROGRAM_SEQUENCES_SPANS = global_spans
-        else:
-            DEPARTMENT_SEQUENCES_SPANS = global_spans
+        sequences_spans[page_type] = global_spans
 
         self.spans = spans
 
 
-    def fix_2017_exec_sheet_bugs(self):
-        if not (self.datetime.year == 2017 and
-            self.datetime.month == 2 and
-            self.datetime.day == 23):
-            return
-
-        if self.pagenum == 576:
-            for i in range(18, 22):
-                line = self.text[i]
-                line = delchar_at_pos(line, -14)
-                line = inschar_at_pos(line, " ", -1)
-                self.text[i] = line
-
-            for i in range(18, 26):
-                self.text[i] = inschar_at_pos(self.text[i], " ", -1)
-
-        if self.pagenum == 1018:
-            self.text[30] = delchar_at_pos(self.text[30], 99)
-            self.text[30] = inschar_at_pos(self.text[30], " ", 110)
-            self.text[30] = delchar_at_pos(self.text[30], -15)
-            self.text[30] = inschar_at_pos(self.text[30], " ", -1)
-            self.text[20] = self.text[20].replace("GRAND TOTAL      APPROPRIATIONS",
-                                                  "     GRAND TOTAL APPROPRIATIONS");
-
-
-
-    def fix_2017_hd_sheet_bugs(self):
-        if not (self.datetime.year == 2017 and
-                self.datetime.month == 3 and
-                self.datetime.day == 15):
-            return
-
-        if self.pagenum == 1093:
-            self.text = [line.replace("GRAND TOTAL      APPROPRIATIONS", "     GRAND TOTAL APPROPRIATIONS") for line in self.text]
-
-        if self.pagenum in [285, 704, 766, 780, 221]:
-            self.text = [line.replace(" (", "(").replace(") ", ")  ") for line in self.text]
-
-        #self.text = [re.sub("  \(([0-9,\.]+)\) ([A-Z])", r" (\1)  \2", line) for line in self.text]
-
-
-    def fix_2017_sd_sheet_bugs(self):
-        if not (self.datetime.year == 2017 and
-                self.datetime.month == 4 and
-                self.datetime.day == 4):
-            return
-
-
-        if self.pagenum in [657]:
-            self.text = [line.replace(" (", "(").replace(")", ") ") for line in self.text]
-
-
     def eat_empty_lines(self):
         while self.curline < len(self.lines) and self.lines[self.curline] == [""]:
             self.curline += 1
@@ -354,14 +394,6 @@ class HBWSPage:
         return self.lines[self.curline-1]
 
 
-    def hack_sequence_blocks(self, seq_blocks, special_col):
-        for seq_id, seq_lines in seq_blocks.items():
-            for i, seq_line in enumerate(seq_lines):
-                if special_col < len(seq_line) and seq_line[special_col] != " ":
-                    seq_lines[i] = inschar_at_pos(seq_line, " ", special_col)
-            seq_blocks[seq_id] = seq_lines
-        return seq_blocks
-
     def find_sequence_blocks(self):
         special_explanations = SPECIAL_EXPLANATIONS
 
@@ -388,7 +420,7 @@ class HBWSPage:
             seq_id = seq_ids[-1]
             sequences[seq_id].append(text)
 
-        for key in sequences.keys():
+        for key in list(sequences.keys()):
             if not sequences[key]:
                 del sequences[key]
                 del seq_ids[seq_ids.index(key)]
@@ -609,28 +641,61 @@ class HBWSPage:
 
 
 
-def pdftotext(pdf_filename):
-    cmd = ["pdftotext",
-           "-layout",
-           "-fixed {}".format(PDFTOTEXT_FIXED_PARAM),
-           '"'+pdf_filename+'"',
-           "-"]
-    buf = subprocess.check_output(" ".join(cmd), shell=True)
-    text = buf.decode("utf-8")
-    return text
+def pdftotext_cmd(pdf_filename):
+    return ["pdftotext",
+            "-layout",
+            "-fixed", str(PDFTOTEXT_FIXED_PARAM),
+            pdf_filename,
+            "-"]
+
 
+def pdfinfo_cmd(pdf_filename):
+    return ["pdfinfo",
+            "-meta",
+            pdf_filename]
 
-def pdf_creation_datetime(pdf_filename):
-    cmd = ["pdfinfo",
-           "-meta",
-           '"'+pdf_filename+'"']
-    buf = subprocess.check_output(" ".join(cmd), shell=True)
-    text = buf.decode("utf-8")
+
+def parse_pdfinfo_creation_datetime(text):
     cdate = [line for line in text.split("\n") if line.startswith("CreationDate:")]
     datetimestr = "" if not cdate else cdate[0].split("CreationDate:")[-1].strip()
-
     return datetimestr
 
 
+async def start_pdftotext(pdf_filename):
+    return await asyncio.create_subprocess_exec(*pdftotext_cmd(pdf_filename),
+                                                stdout=asyncio.subprocess.PIPE)
+
+
+async def pdftotext_pages(proc, pdf_filename):
+    """Yield the text of each page from a running pdftotext as soon as it is complete"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+
+    while True:
+        buf = await proc.stdout.read(PDFTOTEXT_READ_SIZE)
+        pending += decoder.decode(buf, final=not buf)
+        # split pages at pagebreak char
+        pages = pending.split("\x0c")
+        pending = pages.pop()
+        for page in pages:
+            yield page
+        if not buf:
+            break
+
+    # whatever follows the last pagebreak is the empty page pdftotext creates, drop it
+    returncode = await proc.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, pdftotext_cmd(pdf_filename))
+
+
+async def pdf_creation_datetime_async(pdf_filename):
+    cmd = pdfinfo_cmd(pdf_filename)
+    proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE)
+    buf, _ = await proc.communicate()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return parse_pdfinfo_creation_datetime(buf.decode("utf-8"))
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
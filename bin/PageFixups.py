@@ -0,0 +1,210 @@
+__license__ = "GPLv3"
+__doc__ = """
+PageFixups.py:
+Loads declarative per-document, per-page fixup rules (see page_fixups.json),
+compiles them once, and indexes them by (PDF creation datetime, page number)
+so that only the rules matching a page are applied to it.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import re
+
+
+DEFAULT_FIXUPS_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_fixups.json")
+
+ANY_DOCUMENT = "*"
+
+STAGES = ("header", "text", "sequences")
+
+EMPTY = ()
+
+MONTHS = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+          "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
+
+# pdfinfo -isodates: 2017-02-23T19:27:15-10
+ISO_DATETIME_RE = re.compile(r"(\d{4})-(\d\d)-(\d\d)T(\d\d:\d\d:\d\d)")
+# C locale %c: Thu Feb 23 19:27:15 2017, newer poppler appends a timezone
+CTIME_DATETIME_RE = re.compile(r"[A-Za-z]{3} ([A-Za-z]{3}) (\d{1,2}) (\d\d:\d\d:\d\d) (\d{4})")
+
+
+def normalize_datetimestr(datetimestr):
+    """pdfinfo CreationDate as 'YYYY-MM-DDTHH:MM:SS', without any timezone suffix
+
+    Strings in neither form are returned with whitespace collapsed, so they
+    can still be used as document keys.
+    """
+    datetimestr = " ".join(datetimestr.split())
+
+    match = ISO_DATETIME_RE.match(datetimestr)
+    if match:
+        return "{}-{}-{}T{}".format(*match.groups())
+
+    match = CTIME_DATETIME_RE.match(datetimestr)
+    if match and match.group(1) in MONTHS:
+        month, day, time, year = match.groups()
+        return "{}-{:02d}-{:02d}T{}".format(year, MONTHS[month], int(day), time)
+
+    return datetimestr
+
+
+def delchar_at_pos(txt, atpos):
+    return txt[:atpos] + txt[atpos+1:]
+
+def inschar_at_pos(txt, char, atpos):
+    return txt[:atpos] + char + txt[atpos:]
+
+
+def _line_indices(rule):
+    return None if rule.get("lines") is None else list(rule["lines"])
+
+
+def _compile_line_op(rule, fn):
+    indices = _line_indices(rule)
+
+    if indices is None:
+        def apply(lines):
+            return [fn(line) for line in lines]
+    else:
+        def apply(lines):
+            for i in indices:
+                lines[i] = fn(lines[i])
+            return lines
+
+    return apply
+
+
+def _compile_text_rule(rule):
+    op = rule["op"]
+
+    if op == "replace":
+        old, new = rule["old"], rule["new"]
+        return _compile_line_op(rule, lambda line: line.replace(old, new))
+
+    if op == "delete_char":
+        pos = rule["pos"]
+        return _compile_line_op(rule, lambda line: delchar_at_pos(line, pos))
+
+    if op == "insert_char":
+        pos, char = rule["pos"], rule.get("char", " ")
+        return _compile_line_op(rule, lambda line: inschar_at_pos(line, char, pos))
+
+    raise ValueError("unknown text fixup op '{}' in rule {}".format(op, rule))
+
+
+def _compile_header_rule(rule):
+    op = rule["op"]
+
+    if op == "splice_fields":
+        start, end, fields = rule["start"], rule["end"], list(rule["fields"])
+        def apply(line):
+            return line[:start] + fields + line[end:]
+        return apply
+
+    raise ValueError("unknown header fixup op '{}' in rule {}".format(op, rule))
+
+
+def _compile_sequences_rule(rule):
+    op = rule["op"]
+
+    if op == "pad_column":
+        # insert a space at pos in any sequence line that has a non-space there
+        pos, char = rule["pos"], rule.get("char", " ")
+        def apply(seq_blocks):
+            for seq_id, seq_lines in seq_blocks.items():
+                for i, seq_line in enumerate(seq_lines):
+                    if pos < len(seq_line) and seq_line[pos] != " ":
+                        seq_lines[i] = inschar_at_pos(seq_line, char, pos)
+            return seq_blocks
+        return apply
+
+    raise ValueError("unknown sequences fixup op '{}' in rule {}".format(op, rule))
+
+
+COMPILERS = {
+    "header": _compile_header_rule,
+    "text": _compile_text_rule,
+    "sequences": _compile_sequences_rule,
+}
+
+
+def _rule_digest(specs):
+    blob = json.dumps(specs, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+class PageFixups(object):
+    """Compiled fixup rules indexed by (pdf creation datetime, page number)
+
+    Document keys and looked up datetimes both go through
+    normalize_datetimestr(), so rules keep matching whichever format the
+    installed pdfinfo prints.
+
+    A page number of None in the index holds rules that apply to every page
+    of a document; ANY_DOCUMENT holds rules that apply to every document.
+    """
+    def __init__(self, spec = None):
+        spec = spec or {}
+        # (datetimestr, pagenum) -> [(page_type, stage, rule, compiled_fn), ...]
+        self.index = collections.defaultdict(list)
+        # (datetimestr, pagenum) -> entries, see _entries()
+        self._entries_cache = {}
+        # (datetimestr, pagenum, stage, page_type) -> compiled fns, see rules()
+        self._rules_cache = {}
+
+        for datetimestr, rules in spec.get("documents", {}).items():
+            if datetimestr != ANY_DOCUMENT:
+                datetimestr = normalize_datetimestr(datetimestr)
+            for rule in rules:
+                stage = rule.get("stage", "text")
+                assert stage in STAGES, "unknown fixup stage '{}' in rule {}".format(stage, rule)
+                page_type = rule.get("page_type")
+                assert page_type in (None, "program", "department"), "unknown page_type in rule {}".format(rule)
+                assert not (stage == "header" and rule.get("pages")), "header fixups cannot select pages: {}".format(rule)
+
+                entry = (page_type, stage, rule, COMPILERS[stage](rule))
+                for pagenum in rule.get("pages") or [None]:
+                    self.index[(datetimestr, pagenum)].append(entry)
+
+
+    @staticmethod
+    def load(filename = DEFAULT_FIXUPS_FILENAME):
+        with open(filename, "rt") as f:
+            return PageFixups(json.load(f))
+
+
+    def _entries(self, datetimestr, pagenum):
+        key = (datetimestr, pagenum)
+        entries = self._entries_cache.get(key)
+        if entries is None:
+            datetimestr = normalize_datetimestr(datetimestr)
+            keys = [(ANY_DOCUMENT, None), (datetimestr, None)]
+            if pagenum is not None:
+                keys += [(ANY_DOCUMENT, pagenum), (datetimestr, pagenum)]
+            entries = []
+            for k in keys:
+                entries += self.index.get(k, EMPTY)
+            entries = tuple(entries)
+            self._entries_cache[key] = entries
+        return entries
+
+
+    def rules(self, datetimestr, pagenum, stage, page_type = None):
+        """Return the compiled fixup functions for one page and stage, in file order"""
+        key = (datetimestr, pagenum, stage, page_type)
+        fns = self._rules_cache.get(key)
+        if fns is None:
+            fns = tuple(fn for ptype, st, rule, fn in self._entries(datetimestr, pagenum)
+                        if st == stage and (ptype is None or ptype == page_type))
+            self._rules_cache[key] = fns
+        return fns
+
+
+    def page_digest(self, datetimestr, pagenum):
+        """Hash of only the rules that can touch this page
+
+        Stored with each page block of a .tsvz, see TSVBlockReader.stale_blocks().
+        """
+        return _rule_digest([rule for ptype, st, rule, fn in self._entries(datetimestr, pagenum)])
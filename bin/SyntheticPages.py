@@ -0,0 +1,246 @@
+__license__ = "GPLv3"
+__doc__ = """
+SyntheticPages.py:
+Generates synthetic budget worksheet pages in the layout `pdftotext -layout`
+produces for the real worksheets (page headers, program and department
+pages, sequence blocks, special totals, 9 column body), so the parser can
+be exercised at any size without PDFs or pdftotext.
+"""
+
+import datetime
+import random
+
+import Hawaii_Legislature_Budget_Worksheet_Converter as hbws
+
+
+# pdfinfo CreationDate of synthetic documents, matches no document specific fixups
+SYNTHETIC_DATETIMESTR = "Synthetic"
+
+DEFAULT_LINE_WIDTH = 185
+DEFAULT_EXPLANATION_WIDTH = 48
+
+# widths of the 8 numeric columns following the explanation:
+# perm, temp, amt, mof for each fiscal year
+NUMERIC_WIDTHS = [8, 8, 14, 1, 8, 8, 14, 1]
+
+# program pages get a space inserted at this column (relative to the
+# explanation) by the page fixups if it isn't blank, keep it blank
+PAD_COLUMN = 162
+
+WORDS = ["ADD", "FUNDS", "FOR", "COLLECTIVE", "BARGAINING", "INCREASES",
+         "REDUCE", "POSITIONS", "AND", "TRANSFER", "TO", "PROGRAM", "FRINGE",
+         "BENEFIT", "RATE", "STATE", "HAWAII", "WATER", "INFRASTRUCTURE",
+         "LOAN", "REVOLVING", "FUND", "CEILING", "SPECIAL", "OPERATING",
+         "EXPENSES", "(A/B)", "FY18", "FY19", "PERM", "TEMP"]
+
+EXPLANATION_HEADS = ["EXECUTIVE REQUEST:", "EXECUTIVE BUDGET PREP:", "HOUSE:", "SENATE:"]
+
+MOFS = sorted(hbws.MOF.keys())
+
+
+def column_layout(line_width = DEFAULT_LINE_WIDTH, explanation_width = DEFAULT_EXPLANATION_WIDTH):
+    """(start, end) of the 8 numeric columns, relative to the explanation column
+
+    The space left after the explanation is spread evenly between the
+    numeric columns, so line_width is approximate.  Columns are at least 2
+    apart, lines narrower than that layout (147 with the defaults) come
+    out wider than line_width.
+    """
+    width = line_width - hbws.COL_BEG_EXPLANATION_NUM
+    gap = max(2, (width - explanation_width - sum(NUMERIC_WIDTHS)) // len(NUMERIC_WIDTHS))
+
+    layout = []
+    pos = explanation_width
+    for w in NUMERIC_WIDTHS:
+        pos += gap
+        if pos <= PAD_COLUMN < pos + w:
+            pos = PAD_COLUMN + 1
+        layout.append((pos, pos + w))
+        pos += w
+    return layout
+
+
+def fields_line(*fields):
+    # pdftotext separates header fields by runs of spaces, HBWSPage splits at 2 or more
+    return "  " + "    ".join(fields)
+
+
+class SyntheticDocument(object):
+    """A synthetic worksheet of a given number of pages, see pages()"""
+    def __init__(self, num_pages, line_width = DEFAULT_LINE_WIDTH,
+                 explanation_width = DEFAULT_EXPLANATION_WIDTH, seed = 0):
+        assert num_pages >= 2, "need at least one program/department page and the grand total page"
+        self.num_pages = num_pages
+        self.explanation_width = explanation_width
+        self.layout = column_layout(line_width, explanation_width)
+        self.rng = random.Random(seed)
+        self.datetime = datetime.datetime(2017, 3, 15, 14, 45, 43)
+        self.detail_type = "H"
+        self.year0 = 2018
+
+
+    def pages(self):
+        """Yield the text of each page, in order"""
+        rng = self.rng
+        dept_codes = sorted(hbws.DEPT_DESC.keys())
+        pagenum = 0
+
+        while True:
+            for dept_code in dept_codes:
+                for program_id in range(101, 101 + rng.randint(1, 6)):
+                    program_name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+                    for part in range(rng.randint(1, 3)):
+                        pagenum += 1
+                        if pagenum == self.num_pages:
+                            yield self.grand_total_page(pagenum)
+                            return
+                        yield self.program_page(pagenum, dept_code, program_id, program_name, part == 0)
+
+                pagenum += 1
+                if pagenum == self.num_pages:
+                    yield self.grand_total_page(pagenum)
+                    return
+                yield self.department_page(pagenum, dept_code)
+
+
+    def text(self):
+        """All pages as pdftotext would print them, ending in a pagebreak"""
+        return "".join(page + "\x0c" for page in self.pages())
+
+
+    def header_lines(self, pagenum):
+        dt = self.datetime
+        return [fields_line(dt.strftime("%A, %B %d, %Y").replace(" 0", " "),
+                            dt.strftime("%I:%M:%S %p").lstrip("0"),
+                            "LEGISLATIVE BUDGET SYSTEM",
+                            "Page {} of {}".format(pagenum, self.num_pages)),
+                fields_line("Detail Type: {}".format(self.detail_type), "BUDGET WORKSHEET"),
+                ""]
+
+
+    def numbers(self, mof = None):
+        """Perm, temp, amt, mof cells of one body line for both fiscal years"""
+        rng = self.rng
+        cells = []
+        for year in range(2):
+            perm = "{:.2f}".format(rng.randint(0, 4000) / 4)
+            temp = "{:.2f}".format(rng.randint(0, 40) / 4)
+            amt = "{:,}".format(rng.randint(1, 10 ** rng.randint(1, 11)))
+            cells += [perm, temp, amt, mof or ""]
+        return cells
+
+
+    def body_line(self, seq_id, explanation, cells = None):
+        line = (seq_id.rjust(hbws.COL_END_SEQUENCE_NUM - 2)).ljust(hbws.COL_BEG_EXPLANATION_NUM)
+        text = explanation
+        for (start, end), cell in zip(self.layout, cells or []):
+            if not cell:
+                continue
+            text = text.ljust(end)
+            # numbers are right aligned, mof is left aligned
+            text = text[:end - len(cell)] + cell if end - start > 1 else text[:start] + cell + text[start + 1:]
+        return (line + text).rstrip()
+
+
+    def explanation_lines(self):
+        rng = self.rng
+        lines = [rng.choice(EXPLANATION_HEADS)]
+        for _ in range(rng.randint(1, 4)):
+            words = []
+            while True:
+                word = rng.choice(WORDS)
+                if len(" ".join(words + [word])) >= self.explanation_width - 1:
+                    break
+                words.append(word)
+            lines.append(" " + " ".join(words))
+        return lines
+
+
+    def special_lines(self, special):
+        mofs = self.rng.sample(MOFS, self.rng.randint(1, 3))
+        lines = [self.body_line("", special, self.numbers(mof)) for mof in mofs]
+        lines.append(self.body_line("", special, self.numbers()))
+        return lines
+
+
+    def sequence_lines(self, seq_id):
+        rng = self.rng
+        lines = []
+        for i, explanation in enumerate(self.explanation_lines()):
+            cells = None
+            if i and rng.random() < 0.5:
+                cells = self.numbers(rng.choice(MOFS))
+            lines.append(self.body_line(seq_id if i == 0 else "", explanation, cells))
+        return lines
+
+
+    def program_page(self, pagenum, dept_code, program_id, program_name, first):
+        rng = self.rng
+        lines = self.header_lines(pagenum)
+        lines += [fields_line("Program ID", "{}{}".format(dept_code, program_id), program_name),
+                  "",
+                  fields_line("Structure #:", "{:012d}".format(rng.randint(10 ** 10, 10 ** 11))),
+                  fields_line("Subject Committee: AGR", "AGRICULTURE"),
+                  "",
+                  fields_line("SEQ #", "EXPLANATION", "FY {}".format(self.year0), "FY {}".format(self.year0 + 1)),
+                  fields_line("Perm", "Temp", "Amt", "Perm", "Temp", "Amt"),
+                  ""]
+
+        body = []
+        if first:
+            body += self.special_lines("BASE APPROPRIATIONS")
+            objective = "OBJECTIVE: TO PROMOTE " + program_name
+            body += [self.body_line("- 1", objective[:self.explanation_width - 1].rstrip())]
+        for seq in range(rng.randint(2, 6)):
+            body += self.sequence_lines("{}-{:03d}".format(rng.randint(1, 1100), seq + 1))
+            body.append("")
+        body += self.special_lines("TOTAL BUDGET CHANGES")
+        body += self.special_lines("BUDGET TOTALS")
+
+        return "\n".join(lines + self.fill_explanation_gaps(body))
+
+
+    def department_page(self, pagenum, dept_code):
+        lines = self.header_lines(pagenum)
+        lines += [fields_line("Department:", dept_code, hbws.DEPT_DESC[dept_code]),
+                  ""]
+        lines += self.department_table_header()
+
+        body = []
+        for special in ["DEPARTMENT APPROPRIATIONS", "TOTAL DEPARTMENT APPROPRIATIONS",
+                        "DEPARTMENT BUDGET CHANGES", "TOTAL DEPARTMENT BUDGET CHANGES",
+                        "DEPARTMENT TOTAL BUDGET", "TOTAL DEPARTMENT BUDGET"]:
+            body += self.special_lines(special)
+            body.append("")
+
+        return "\n".join(lines + self.fill_explanation_gaps(body))
+
+
+    def grand_total_page(self, pagenum):
+        lines = self.header_lines(pagenum)
+        lines += self.department_table_header()
+        body = self.special_lines("GRAND TOTAL BUDGET")
+        return "\n".join(lines + self.fill_explanation_gaps(body))
+
+
+    def department_table_header(self):
+        return [fields_line("EXPLANATION", "FIRST FY", "SECOND FY"),
+                fields_line("Perm", "Temp", "Amt", "Perm", "Temp", "Amt"),
+                ""]
+
+
+    def fill_explanation_gaps(self, body):
+        """Hyphenate words so the explanation column is a single span on every page
+
+        Real pages have enough explanation text that some line covers every
+        column, the parser deduces columns from exactly that.
+        """
+        beg = hbws.COL_BEG_EXPLANATION_NUM
+        end = beg + self.explanation_width
+        longest = max(range(len(body)), key=lambda i: len(body[i][beg:end].rstrip()))
+        width = len(body[longest][beg:end].rstrip())
+        for col in range(beg, beg + width):
+            if all(col >= len(line) or line[col] == " " for line in body):
+                line = body[longest]
+                body[longest] = line[:col] + "-" + line[col + 1:]
+        return body
@@ -0,0 +1,170 @@
+__license__ = "GPLv3"
+__doc__ = """
+TSVBlocks.py:
+Seekable block-compressed TSV (.tsvz) output.  Rows are written in gzip
+blocks, one per worksheet page that has rows, followed by a footer index mapping
+pagenum/department_code/program_id to block offsets, so a reader can seek
+to and decompress only the pages it needs.
+
+Layout:
+    MAGIC
+    gzip block (rows of page 1)
+    gzip block (rows of page 2)
+    ...
+    gzip block (JSON index: header, pdf creation datetime, one entry per page)
+    struct ">Q" offset of the index block, MAGIC
+"""
+
+import gzip
+import io
+import json
+import struct
+
+
+MAGIC = b"HBWSTSVZ1\n"
+TRAILER = struct.Struct(">Q")
+TRAILER_SIZE = TRAILER.size + len(MAGIC)
+
+COMPRESSLEVEL = 9
+
+# Index entry keys that can be used to select blocks
+INDEX_KEYS = ["pagenum", "department_code", "program_id"]
+
+
+def split_rows(text, delimiter = None):
+    """Split converter output into rows of cells
+
+    Every cell is quoted but quotes inside cells are not escaped, so rows
+    and cells are split at the quote-delimiter-quote sequences instead of
+    using the csv module.  Without a delimiter it is taken from the first
+    row: tab for the .tsv files, comma for the 2016 .csv files.
+    """
+    text = text.replace("\r\n", "\n").strip("\n")
+    if not text:
+        return []
+    if delimiter is None:
+        first_row = text.split("\n", 1)[0]
+        delimiter = "\t" if '"\t"' in first_row else ","
+    cell_sep = '"' + delimiter + '"'
+    return [row.split(cell_sep) for row in text[1:-1].split('"\n"')]
+
+
+class TSVBlockWriter(object):
+    """Write rows of TSV text, one gzip block per call to write_block()"""
+    def __init__(self, f, header, delimiter = "\t", pdf_creation_datetime = None):
+        self.f = f
+        self.header = list(header)
+        self.delimiter = delimiter
+        self.pdf_creation_datetime = pdf_creation_datetime
+        self.blocks = []
+        self.f.write(MAGIC)
+        self.offset = len(MAGIC)
+
+
+    def _write(self, data):
+        buf = gzip.compress(data, COMPRESSLEVEL)
+        offset = self.offset
+        self.f.write(buf)
+        self.offset += len(buf)
+        return offset, len(buf)
+
+
+    def write_block(self, csv_rows, fixups = None, **keys):
+        """Compress already formatted TSV rows into one block, keys are stored in the index
+
+        fixups is the PageFixups.page_digest() the page was converted with.
+        Pages without rows get an index entry without a block, so their
+        fixups are recorded too.
+        """
+        offset, length = None, 0
+        if csv_rows:
+            offset, length = self._write(("\n".join(csv_rows) + "\n").encode("utf-8"))
+        entry = { key: keys.get(key) for key in INDEX_KEYS }
+        entry.update(offset=offset, length=length, rows=len(csv_rows), fixups=fixups)
+        self.blocks.append(entry)
+
+
+    def close(self):
+        index = {"header": self.header,
+                 "delimiter": self.delimiter,
+                 "pdf_creation_datetime": self.pdf_creation_datetime,
+                 "blocks": self.blocks}
+        offset, length = self._write(json.dumps(index).encode("utf-8"))
+        self.f.write(TRAILER.pack(offset) + MAGIC)
+
+
+class TSVBlockReader(object):
+    """Read the index of a .tsvz file and decompress only the selected blocks"""
+    def __init__(self, f):
+        self.f = f
+
+        f.seek(0)
+        assert f.read(len(MAGIC)) == MAGIC, "not a TSVBlocks file"
+
+        size = f.seek(0, io.SEEK_END)
+        assert size >= len(MAGIC) + TRAILER_SIZE, "TSVBlocks trailer is missing or truncated"
+
+        f.seek(-TRAILER_SIZE, io.SEEK_END)
+        trailer = f.read(TRAILER_SIZE)
+        assert trailer[TRAILER.size:] == MAGIC, "TSVBlocks trailer is missing or truncated"
+        index_offset, = TRAILER.unpack(trailer[:TRAILER.size])
+        index_length = f.tell() - TRAILER_SIZE - index_offset
+
+        index = json.loads(self._read(index_offset, index_length).decode("utf-8"))
+        self.header = index["header"]
+        self.delimiter = index["delimiter"]
+        self.pdf_creation_datetime = index["pdf_creation_datetime"]
+        self.blocks = index["blocks"]
+
+
+    @staticmethod
+    def open(filename):
+        f = open(filename, "rb")
+        try:
+            return TSVBlockReader(f)
+        except:
+            f.close()
+            raise
+
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def _read(self, offset, length):
+        self.f.seek(offset)
+        return gzip.decompress(self.f.read(length))
+
+
+    def select(self, **keys):
+        """Index entries whose pagenum/department_code/program_id match all given keys"""
+        for key in keys:
+            assert key in INDEX_KEYS, "can only select blocks by {}".format(INDEX_KEYS)
+        return [block for block in self.blocks
+                if all(block[key] == val for key, val in keys.items())]
+
+
+    def read_text(self, **keys):
+        """TSV text (without header) of the matching blocks"""
+        return "".join(self._read(block["offset"], block["length"]).decode("utf-8")
+                       for block in self.select(**keys) if block["rows"])
+
+
+    def read_rows(self, **keys):
+        """Matching rows as lists of strings, in header order"""
+        return split_rows(self.read_text(**keys), self.delimiter)
+
+
+    def stale_blocks(self, fixups):
+        """Blocks converted with different page fixups than the given PageFixups has now
+
+        Only the pages whose fixup rules were edited need converting again.
+        """
+        return [block for block in self.blocks
+                if block["fixups"] != fixups.page_digest(self.pdf_creation_datetime, block["pagenum"])]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+__license__ = "GPLv3"
+__doc__ = """
+benchmark_parser.py:
+Measures how the HBWSPage parser (Spans.union via parse_sequences_spans,
+get_spreadsheet_rows) scales with page count and line width, on synthetic
+pages from SyntheticPages.py.  pdftotext is not needed.
+
+Prints one TSV row per (pages, line width) and optionally plots throughput
+and peak memory against size (needs matplotlib).
+"""
+
+import getopt
+import sys
+import time
+import tracemalloc
+
+import Hawaii_Legislature_Budget_Worksheet_Converter as hbws
+import SyntheticPages
+
+
+DEFAULT_PAGES = [100, 300, 1000]
+DEFAULT_LINE_WIDTHS = [SyntheticPages.DEFAULT_LINE_WIDTH]
+
+COLUMNS = ["pages", "line_width", "max_line_width", "lines", "rows",
+           "page_s", "parse_sequences_spans_s", "get_spreadsheet_rows_s",
+           "pages_per_s", "lines_per_s", "peak_kb"]
+
+
+def usage():
+    hbws.err("usage: {} [-p pages,...] [-w line_width,...] [-s seed] [-o plot.png]".format(sys.argv[0]))
+
+
+def parse_pages(textpages):
+    """Parse every page, return (HBWSPage construction s, parse_sequences_spans s, get_spreadsheet_rows s, rows)"""
+    sequences_spans = hbws.new_sequences_spans()
+    page_s = spans_s = rows_s = 0.0
+    nrows = 0
+
+    for text in textpages:
+        t0 = time.perf_counter()
+        page = hbws.HBWSPage(text, SyntheticPages.SYNTHETIC_DATETIMESTR, sequences_spans)
+        t1 = time.perf_counter()
+        # HBWSPage already did this once while constructing, time it on its own
+        page.parse_sequences_spans(page.sequences)
+        t2 = time.perf_counter()
+        nrows += len(page.get_spreadsheet_rows())
+        t3 = time.perf_counter()
+
+        page_s += t1 - t0
+        spans_s += t2 - t1
+        rows_s += t3 - t2
+
+    return page_s, spans_s, rows_s, nrows
+
+
+def peak_memory_kb(textpages):
+    tracemalloc.start()
+    try:
+        sequences_spans = hbws.new_sequences_spans()
+        # keep the rows, like pdf_to_csv does
+        rows = [hbws.HBWSPage(text, SyntheticPages.SYNTHETIC_DATETIMESTR, sequences_spans).get_spreadsheet_rows()
+                for text in textpages]
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak // 1024
+
+
+def benchmark(num_pages, line_width, seed = 0):
+    doc = SyntheticPages.SyntheticDocument(num_pages, line_width = line_width, seed = seed)
+    textpages = list(doc.pages())
+    lines = sum(text.count("\n") + 1 for text in textpages)
+    # narrow line widths don't fit the columns and come out wider
+    max_line_width = max(len(line) for text in textpages for line in text.split("\n"))
+
+    page_s, spans_s, rows_s, nrows = parse_pages(textpages)
+    total_s = page_s + rows_s
+
+    return {"pages": num_pages,
+            "line_width": line_width,
+            "max_line_width": max_line_width,
+            "lines": lines,
+            "rows": nrows,
+            "page_s": round(page_s, 4),
+            "parse_sequences_spans_s": round(spans_s, 4),
+            "get_spreadsheet_rows_s": round(rows_s, 4),
+            "pages_per_s": round(num_pages / total_s, 1),
+            "lines_per_s": round(lines / total_s, 1),
+            "peak_kb": peak_memory_kb(textpages)}
+
+
+def plot(results, filename):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        hbws.err("matplotlib is not installed, not writing {}".format(filename))
+        return
+
+    fig, (ax_speed, ax_mem) = plt.subplots(1, 2, figsize=(12, 5))
+    for line_width in sorted(set(r["line_width"] for r in results)):
+        rs = [r for r in results if r["line_width"] == line_width]
+        pages = [r["pages"] for r in rs]
+        ax_speed.plot(pages, [r["pages_per_s"] for r in rs], marker="o", label="width {}".format(line_width))
+        ax_mem.plot(pages, [r["peak_kb"] for r in rs], marker="o", label="width {}".format(line_width))
+
+    ax_speed.set_xscale("log")
+    ax_speed.set_xlabel("pages")
+    ax_speed.set_ylabel("pages / s")
+    ax_mem.set_xscale("log")
+    ax_mem.set_yscale("log")
+    ax_mem.set_xlabel("pages")
+    ax_mem.set_ylabel("peak KiB")
+    ax_speed.legend()
+    ax_mem.legend()
+    fig.tight_layout()
+    fig.savefig(filename)
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "p:w:s:o:")
+    except getopt.GetoptError as e:
+        hbws.err(e)
+        usage()
+        return 2
+
+    page_counts = DEFAULT_PAGES
+    line_widths = DEFAULT_LINE_WIDTHS
+    seed = 0
+    plot_filename = None
+    for opt, val in opts:
+        if opt == "-p":
+            page_counts = [int(v) for v in val.split(",")]
+        elif opt == "-w":
+            line_widths = [int(v) for v in val.split(",")]
+        elif opt == "-s":
+            seed = int(val)
+        elif opt == "-o":
+            plot_filename = val
+
+    results = []
+    print("\t".join(COLUMNS))
+    for line_width in line_widths:
+        for num_pages in page_counts:
+            result = benchmark(num_pages, line_width, seed)
+            results.append(result)
+            print("\t".join(str(result[col]) for col in COLUMNS))
+            sys.stdout.flush()
+
+    if plot_filename:
+        plot(results, plot_filename)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
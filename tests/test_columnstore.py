@@ -0,0 +1,38 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+
+import ColumnStore
+
+
+def test_missing_cells_decode_to_none():
+    store = ColumnStore.ColumnStore.load([os.path.join(ROOT, "2016", "HB1700GM(EXEC)Worksheets.csv")])
+
+    row = store.row(0)
+    assert row["amt_y0"] == 102500
+    assert row["amt_y1"] is None
+    assert row["pos_temp_y0"] is None
+
+    department_rows = store.where(program_id=None)
+    assert department_rows
+    assert store.row(department_rows[0])["program_id"] is None
+
+    no_temp_rows = store.where(pos_temp_y0=None)
+    assert 0 in no_temp_rows
+    assert all(store.row(i)["pos_temp_y0"] is None for i in no_temp_rows)
+    assert store.where(no_temp_rows, amt_y1=None) == [i for i in no_temp_rows if store.row(i)["amt_y1"] is None]
+
+
+def test_fractional_amounts_are_bad_cells(tmp_path):
+    header = ["datetime", "pagenum", "explanation", "amt_y0", "amt_y1"]
+    rows = [header, ["", "1", "X", "1,234.50", "1,234.00"]]
+    filename = str(tmp_path / "fractional.tsv")
+    with open(filename, "wt") as f:
+        f.write("\n".join("\t".join('"{}"'.format(cell) for cell in row) for row in rows))
+
+    store = ColumnStore.ColumnStore.load([filename])
+    assert store.value("amt_y0", 0) is None
+    assert store.value("amt_y1", 0) == 1234
+    assert store.bad_cells == [(filename, 1, "amt_y0", "1,234.50")]
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import stat
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+
+import Hawaii_Legislature_Budget_Worksheet_Converter as hbws
+import SyntheticPages
+
+
+CONVERTER = os.path.join(ROOT, "bin", "Hawaii_Legislature_Budget_Worksheet_Converter.py")
+
+
+def write_script(path, text):
+    with open(path, "wt") as f:
+        f.write(text)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+
+def fake_poppler(tmp_path, text):
+    """Directory with pdftotext printing text (failing for bad.pdf) and pdfinfo, to put on PATH"""
+    text_filename = str(tmp_path / "pdftotext.txt")
+    with open(text_filename, "wb") as f:
+        f.write(text.encode("utf-8"))
+
+    fakebin = tmp_path / "fakebin"
+    fakebin.mkdir()
+    # pdftotext -layout -fixed N file.pdf -
+    write_script(str(fakebin / "pdftotext"),
+                 "#!/bin/sh\n"
+                 "case \"$4\" in *bad.pdf) echo \"$4: broken\" >&2; exit 1;; esac\n"
+                 "cat '{}'\n".format(text_filename))
+    write_script(str(fakebin / "pdfinfo"),
+                 "#!/bin/sh\n"
+                 "echo 'CreationDate:   {}'\n".format(SyntheticPages.SYNTHETIC_DATETIMESTR))
+    return str(fakebin)
+
+
+def test_failed_pdf_does_not_stop_the_others(tmp_path):
+    fakebin = fake_poppler(tmp_path, SyntheticPages.SyntheticDocument(4).text())
+    bad, good = str(tmp_path / "bad.pdf"), str(tmp_path / "good.pdf")
+    env = dict(os.environ, PATH=fakebin + os.pathsep + os.environ["PATH"])
+
+    # with one job the good PDF is still waiting for the semaphore when the bad one fails
+    proc = subprocess.run([sys.executable, CONVERTER, "-j", "1", bad, good],
+                          env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+
+    assert proc.returncode == 1
+    assert "bad.pdf: conversion failed" in proc.stderr.decode("utf-8")
+    assert not os.path.exists(str(tmp_path / "bad.tsv"))
+    with open(str(tmp_path / "good.tsv"), "rt") as f:
+        assert len(f.read().split("\n")) > 1
+
+
+def test_pdftotext_pages_across_read_boundaries(tmp_path, monkeypatch):
+    # multibyte characters and pagebreaks land on every offset of a 7 byte read
+    pages = ["page {} café — €{}".format(i, "ü" * i) for i in range(20)]
+    fakebin = fake_poppler(tmp_path, "".join(page + "\x0c" for page in pages))
+    monkeypatch.setenv("PATH", fakebin + os.pathsep + os.environ["PATH"])
+    monkeypatch.setattr(hbws, "PDFTOTEXT_READ_SIZE", 7)
+
+    async def read_pages():
+        proc = await hbws.start_pdftotext("good.pdf")
+        return [page async for page in hbws.pdftotext_pages(proc, "good.pdf")]
+
+    assert asyncio.run(read_pages()) == pages
@@ -0,0 +1,142 @@
+import collections
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+
+import PageFixups
+
+
+# pdfinfo CreationDate of the 2017 worksheets, as the C locale prints it
+EXEC_2017 = "Thu Feb 23 19:27:15 2017"
+HD1_2017 = "Wed Mar 15 14:45:43 2017"
+SD1_2017 = "Tue Apr  4 04:26:42 2017"
+
+FIXUPS = PageFixups.PageFixups.load()
+
+delchar_at_pos = PageFixups.delchar_at_pos
+inschar_at_pos = PageFixups.inschar_at_pos
+
+
+def page_lines(seed):
+    """40 lines with the strings the text fixups look for, at varying columns"""
+    rng = random.Random(seed)
+    chars = "ABC 0123456789,.()"
+    specials = [" (", ") ", "(1.00)", "GRAND TOTAL      APPROPRIATIONS"]
+    lines = []
+    for i in range(40):
+        line = "".join(rng.choice(chars) for _ in range(rng.randint(120, 190)))
+        pos = rng.randint(0, len(line))
+        lines.append(line[:pos] + rng.choice(specials) + line[pos:])
+    return lines
+
+
+def apply_text_rules(datetimestr, pagenum, lines, page_type = "program"):
+    lines = list(lines)
+    for fixup in FIXUPS.rules(datetimestr, pagenum, "text", page_type):
+        lines = fixup(lines)
+    return lines
+
+
+# the fixups page_fixups.json replaced, as they were written in HBWSPage
+
+def fix_2017_exec_sheet_bugs(pagenum, text):
+    text = list(text)
+    if pagenum == 576:
+        for i in range(18, 22):
+            line = text[i]
+            line = delchar_at_pos(line, -14)
+            line = inschar_at_pos(line, " ", -1)
+            text[i] = line
+
+        for i in range(18, 26):
+            text[i] = inschar_at_pos(text[i], " ", -1)
+
+    if pagenum == 1018:
+        text[30] = delchar_at_pos(text[30], 99)
+        text[30] = inschar_at_pos(text[30], " ", 110)
+        text[30] = delchar_at_pos(text[30], -15)
+        text[30] = inschar_at_pos(text[30], " ", -1)
+        text[20] = text[20].replace("GRAND TOTAL      APPROPRIATIONS",
+                                    "     GRAND TOTAL APPROPRIATIONS")
+    return text
+
+
+def fix_2017_hd_sheet_bugs(pagenum, text):
+    if pagenum == 1093:
+        text = [line.replace("GRAND TOTAL      APPROPRIATIONS", "     GRAND TOTAL APPROPRIATIONS") for line in text]
+
+    if pagenum in [285, 704, 766, 780, 221]:
+        text = [line.replace(" (", "(").replace(") ", ")  ") for line in text]
+    return list(text)
+
+
+def fix_2017_sd_sheet_bugs(pagenum, text):
+    if pagenum in [657]:
+        text = [line.replace(" (", "(").replace(")", ") ") for line in text]
+    return list(text)
+
+
+def hack_sequence_blocks(seq_blocks, special_col):
+    for seq_id, seq_lines in seq_blocks.items():
+        for i, seq_line in enumerate(seq_lines):
+            if special_col < len(seq_line) and seq_line[special_col] != " ":
+                seq_lines[i] = inschar_at_pos(seq_line, " ", special_col)
+        seq_blocks[seq_id] = seq_lines
+    return seq_blocks
+
+
+def test_text_rules_match_removed_fixups():
+    cases = [(EXEC_2017, 576, fix_2017_exec_sheet_bugs),
+             (EXEC_2017, 1018, fix_2017_exec_sheet_bugs),
+             (HD1_2017, 221, fix_2017_hd_sheet_bugs),
+             (HD1_2017, 1093, fix_2017_hd_sheet_bugs),
+             (SD1_2017, 657, fix_2017_sd_sheet_bugs)]
+
+    for datetimestr, pagenum, old_fixup in cases:
+        lines = page_lines(pagenum)
+        expected = old_fixup(pagenum, lines)
+        assert expected != lines, "page {} test lines don't exercise the fixup".format(pagenum)
+        assert apply_text_rules(datetimestr, pagenum, lines) == expected, (datetimestr, pagenum)
+
+    # other pages and documents are left alone
+    lines = page_lines(0)
+    assert apply_text_rules(EXEC_2017, 577, lines) == lines
+    assert apply_text_rules(HD1_2017, 576, lines) == lines
+    assert apply_text_rules("Mon Jan  1 00:00:00 2018", 576, lines) == lines
+
+
+def test_header_rules_add_missing_timestamp():
+    line = ["", "LEGISLATIVE BUDGET SYSTEM", "Page 1 of 10"]
+    expected = {HD1_2017: ["", "Wednesday, March 15, 2017", "14:45:43 AM"] + line[1:],
+                SD1_2017: ["", "Tuesday, April 4, 2017", "04:26:42 AM"] + line[1:],
+                EXEC_2017: line}
+
+    for datetimestr, expected_line in expected.items():
+        fixed = list(line)
+        for fixup in FIXUPS.rules(datetimestr, None, "header"):
+            fixed = fixup(fixed)
+        assert fixed == expected_line, datetimestr
+
+
+def test_pad_column_only_on_program_pages():
+    text = "X" * 170
+    seq_blocks = lambda: collections.OrderedDict([("1-001", [text, " " * 170, "short"])])
+
+    program = seq_blocks()
+    for fixup in FIXUPS.rules(EXEC_2017, 5, "sequences", "program"):
+        program = fixup(program)
+    assert program == hack_sequence_blocks(seq_blocks(), 162)
+    assert program["1-001"][0][162] == " "
+
+    assert FIXUPS.rules(EXEC_2017, 5, "sequences", "department") == ()
+
+
+def test_normalize_datetimestr():
+    assert PageFixups.normalize_datetimestr("Thu Feb 23 19:27:15 2017") == "2017-02-23T19:27:15"
+    assert PageFixups.normalize_datetimestr("Tue Apr  4 04:26:42 2017") == "2017-04-04T04:26:42"
+    assert PageFixups.normalize_datetimestr("Tue Apr  4 04:26:42 2017 HST") == "2017-04-04T04:26:42"
+    assert PageFixups.normalize_datetimestr("2017-04-04T04:26:42-10") == "2017-04-04T04:26:42"
+    assert PageFixups.normalize_datetimestr("2017-04-04T04:26:42") == "2017-04-04T04:26:42"
@@ -0,0 +1,71 @@
+import io
+import itertools
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+
+import TSVBlocks
+
+
+WORKSHEET = os.path.join(ROOT, "2017", "HB100-HD1-Exec-H-Worksheets.tsv")
+
+
+def quote_row(row):
+    # same formatting as the converter's row_cells_to_csv()
+    return "\t".join('"{}"'.format(cell) for cell in row)
+
+
+def write_worksheet_blocks(rows):
+    header, rows = rows[0], rows[1:]
+    f = io.BytesIO()
+    writer = TSVBlocks.TSVBlockWriter(f, header)
+    for pagenum, page_rows in itertools.groupby(rows, key=lambda row: row[1]):
+        page_rows = list(page_rows)
+        writer.write_block([quote_row(row) for row in page_rows],
+                           pagenum=int(pagenum),
+                           department_code=page_rows[0][6],
+                           program_id=int(page_rows[0][8]) if page_rows[0][8] else None)
+    writer.close()
+    f.seek(0)
+    return f
+
+
+def test_round_trip_real_worksheet():
+    with open(WORKSHEET, "rt") as f:
+        rows = TSVBlocks.split_rows(f.read())
+    header = rows[0]
+    assert all(len(row) == len(header) for row in rows)
+    # explanations with unescaped quotes are what broke csv.reader
+    assert any('"' in row[header.index("explanation")] for row in rows[1:])
+
+    reader = TSVBlocks.TSVBlockReader(write_worksheet_blocks(rows))
+    assert reader.header == header
+    assert reader.read_rows() == rows[1:]
+
+    agr101 = [row for row in rows[1:] if row[6] == "AGR" and row[8] == "101"]
+    assert reader.read_rows(department_code="AGR", program_id=101) == agr101
+
+
+def test_stale_blocks_only_pages_with_edited_fixups():
+    import PageFixups
+
+    datetimestr = "Wed Mar 15 14:45:43 2017"
+    rule = {"pages": [2], "stage": "text", "op": "replace", "old": "A", "new": "B"}
+    before = PageFixups.PageFixups({"documents": {"2017-03-15T14:45:43": [rule]}})
+    after = PageFixups.PageFixups({"documents": {"2017-03-15T14:45:43": [dict(rule, new="C")]}})
+
+    f = io.BytesIO()
+    writer = TSVBlocks.TSVBlockWriter(f, ["pagenum"], pdf_creation_datetime=datetimestr)
+    for pagenum in range(1, 4):
+        # page 2 had no rows, an edited fixup might give it some
+        rows = [quote_row([pagenum])] if pagenum != 2 else []
+        writer.write_block(rows, fixups=before.page_digest(datetimestr, pagenum), pagenum=pagenum)
+    writer.close()
+    f.seek(0)
+
+    reader = TSVBlocks.TSVBlockReader(f)
+    assert reader.stale_blocks(before) == []
+    assert [block["pagenum"] for block in reader.stale_blocks(after)] == [2]
+    assert reader.read_rows() == [["1"], ["3"]]